@@ -1,10 +1,18 @@
 import configparser
-import json
+import sqlite3
+import threading
+import time
 from pathlib import Path
+from typing import Union
 
 import jwt
+import orjson
 import pytz
 import requests
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from euskalmet.exceptions import EuskalmetException
 
 # TODO: Introducir loggers
@@ -36,6 +44,10 @@ class Euskalmet:
         email =
 
 
+    Las respuestas que no cambian con el tiempo (regiones, sensores, lecturas de horas
+    pasadas...) se guardan en la base de datos ``~/.euskalmet/data/cache.sqlite``. Basta con
+    borrar ese fichero para volver a descargarlas.
+
     .. _`web`: https://www.opendata.euskadi.eus/api-euskalmet/-/how-to-use-meteo-rest-services/
     .. _`API`: https://api.euskadi.eus/met01uiApiKeyUsersWar/index.jsp#/
 
@@ -47,11 +59,27 @@ class Euskalmet:
     >>> euskalmet.automatic_download(station_id, multiprocess=True)
     """
 
+    # Sesión HTTP compartida por todas las instancias (Geo, Stations, Weather...)
+    _session = None
+    _session_lock = threading.Lock()
+
     def __init__(self):
         # Define las rutas
         self.data_dir = Path("~/.euskalmet").expanduser() / "data"
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
+        # Respuestas de la API que no cambian con el tiempo. La conexión se comparte entre hilos,
+        # así que todos los accesos pasan por el lock
+        self._cache_db = sqlite3.connect(
+            self.data_dir / "cache.sqlite", check_same_thread=False, isolation_level=None
+        )
+        self._cache_db.execute("PRAGMA journal_mode=WAL")
+        self._cache_db.execute("PRAGMA synchronous=NORMAL")
+        self._cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v BLOB NOT NULL, ts INTEGER)"
+        )
+        self._cache_lock = threading.Lock()
+
         # Define las URLs
         self.base_url = "https://api.euskadi.eus"
 
@@ -64,6 +92,8 @@ class Euskalmet:
         assert self._private_key_path.is_file(), (
             f"No se encuentra el fichero de clave privada " f"en {self._private_key_path}"
         )
+        # Se parsea una única vez para no repetirlo en cada firma del token
+        self._private_key = load_pem_private_key(self._private_key_path.read_bytes(), password=None)
 
         # Read config file
         cfg_file = self.config_dir / "settings.cfg"
@@ -74,10 +104,17 @@ class Euskalmet:
 
         self.tz = pytz.timezone("Europe/Madrid")
 
+        # Cabecera de autenticación, se reutiliza mientras el token no caduque
+        self._header = None
+        self._token_exp = 0
+
     def _get_header(self) -> dict:
         """
         Devuelve el header para la petición.
 
+        El token se firma una única vez y se reutiliza hasta 30 segundos antes de su
+        fecha de expiración.
+
         Returns
         -------
         dict
@@ -87,6 +124,9 @@ class Euskalmet:
         --------
         - https://www.opendata.euskadi.eus/api-euskalmet/-/how-to-use-meteo-rest-services/
         """
+        if self._header is not None and time.time() < self._token_exp - 30:
+            return self._header
+
         payload = {
             "aud": "met01.apikey",
             "iss": self.config["PAYLOAD"]["iss"],
@@ -95,10 +135,84 @@ class Euskalmet:
             "iat": int(self.config["PAYLOAD"]["iat"]),
             "email": self.config["PAYLOAD"]["email"],
         }
-        myToken = jwt.encode(payload, open(self._private_key_path, "rb").read(), algorithm="RS256")
-        return {"Authorization": f"Bearer {myToken}", "Accept": "application/json"}
+        myToken = jwt.encode(payload, self._private_key, algorithm="RS256")
+        self._header = {"Authorization": f"Bearer {myToken}"}
+        self._token_exp = payload["exp"]
+
+        return self._header
 
-    def _download(self, endpoint: str) -> dict:
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        """
+        Devuelve la sesión HTTP compartida, creándola la primera vez.
+
+        Al reutilizar la misma sesión, las conexiones TCP/TLS con la API se mantienen abiertas
+        entre peticiones y entre instancias.
+
+        Returns
+        -------
+        requests.Session
+            Sesión HTTP con un pool de conexiones y reintentos ante errores temporales.
+        """
+        with Euskalmet._session_lock:
+            if Euskalmet._session is None:
+                session = requests.Session()
+                session.mount(
+                    "https://",
+                    HTTPAdapter(
+                        pool_connections=32,
+                        pool_maxsize=32,
+                        max_retries=Retry(
+                            total=3,
+                            backoff_factor=0.3,
+                            status_forcelist=[502, 503, 504],
+                            raise_on_status=False,
+                        ),
+                    ),
+                )
+                # Con brotli instalado, requests ya pide las respuestas también en "br"
+                session.headers.update({"Accept": "application/json"})
+                Euskalmet._session = session
+
+        return Euskalmet._session
+
+    def _cache_get(self, key: str) -> Union[bytes, None]:
+        """
+        Lee un valor de la caché en disco.
+
+        Parameters
+        ----------
+        key: str
+            Clave del valor, normalmente el endpoint de la API
+
+        Returns
+        -------
+        bytes, None
+            JSON guardado, o None si la clave no está en la caché.
+        """
+        with self._cache_lock:
+            row = self._cache_db.execute("SELECT v FROM kv WHERE k = ?", (key,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def _cache_set(self, key: str, value: bytes):
+        """
+        Guarda un valor en la caché en disco, reemplazando el anterior si existe.
+
+        Parameters
+        ----------
+        key: str
+            Clave del valor, normalmente el endpoint de la API
+        value: bytes
+            JSON a guardar
+        """
+        with self._cache_lock:
+            self._cache_db.execute(
+                "INSERT OR REPLACE INTO kv (k, v, ts) VALUES (?, ?, ?)",
+                (key, value, int(time.time())),
+            )
+
+    def _download(self, endpoint: str, cache: bool = False) -> dict:
         """
         Descarga los datos desde la API.
 
@@ -106,6 +220,10 @@ class Euskalmet:
         ----------
         endpoint: str
             Endpoint de la API
+        cache: bool
+            Si es True, la respuesta se guarda en disco y las siguientes llamadas la leen de
+            ahí sin hacer la petición. Solo debe usarse con datos que no cambian, como las
+            lecturas de horas pasadas.
 
         Returns
         -------
@@ -116,8 +234,13 @@ class Euskalmet:
         ------
         EuskalmetException
         """
+        if cache:
+            cached = self._cache_get(endpoint)
+            if cached is not None:
+                return orjson.loads(cached)
+
         headers = self._get_header()
-        r = requests.get(self.base_url + endpoint, headers=headers)
+        r = self._get_session().get(self.base_url + endpoint, headers=headers, timeout=(3.05, 30))
 
         if r.status_code >= 300:
             # print(f"[!] Error {r.status_code}: {self.base_url + endpoint}")
@@ -128,5 +251,12 @@ class Euskalmet:
                     "url": self.base_url + endpoint,
                 }
             )
-        else:
-            return json.loads(r.text)
+
+        # Se parsean directamente los bytes, sin decodificar antes el texto
+        data = orjson.loads(r.content)
+
+        if cache:
+            # La respuesta ya es JSON, se guarda tal cual sin volver a serializarla
+            self._cache_set(endpoint, r.content)
+
+        return data
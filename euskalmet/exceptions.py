@@ -1,29 +1,28 @@
-class EuskalmetException(Exception):
-    def __init__(self, msg):
-        pass
+_ERR_MAP = {
+    401: "Unauthorized",
+    404: "Not found",
+    500: "Internal server error",
+}
+
 
-    def __new__(cls, status, *args, **kwargs):
+class EuskalmetException(Exception):
+    def __init__(self, status: dict, *args):
+        error = status.get("error")
         try:
-            error = int(status["error"])
-        except TypeError:
+            error = int(error)
+        except (TypeError, ValueError):
             pass
-        reason = status["reason"]
-        url = status["url"]
-        if error == 401:
-            msg = "Unauthorized"
-        elif error == 404:
-            msg = "Not found"
-        elif error == 500:
-            msg = "Internal server error"
-        else:
-            msg = "Unknown error"
 
-        msg = f"Error {error} - {msg}"
+        self.status = error
+        self.reason = status.get("reason")
+        self.url = status.get("url")
+
+        msg = f"Error {error} - {_ERR_MAP.get(error, 'Unknown error')}"
 
-        if reason:
-            msg += f" ({reason})"
+        if self.reason:
+            msg += f" ({self.reason})"
 
-        if url:
-            msg += f" - {url}"
+        if self.url:
+            msg += f" - {self.url}"
 
-        return super().__new__(cls, msg, *args, **kwargs)
+        super().__init__(msg, *args)
@@ -41,7 +41,7 @@ class Geo(Euskalmet):
         """
 
         endpoint = "/euskalmet/geo/regions"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -81,7 +81,7 @@ class Geo(Euskalmet):
         """
 
         endpoint = f"/euskalmet/geo/regions/{region_id}"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -100,7 +100,7 @@ class Geo(Euskalmet):
             Lista de zonas de una región de Euskalmet.
         """
         endpoint = f"/euskalmet/geo/regions/{region_id}/zones"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -147,7 +147,7 @@ class Geo(Euskalmet):
         }
         """
         endpoint = f"/euskalmet/geo/regions/{region_id}/zones/{zone_id}"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -195,7 +195,7 @@ class Geo(Euskalmet):
         ]
         """
         endpoint = f"/euskalmet/geo/regions/{region_id}/zones/{zone_id}/locations"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -251,7 +251,7 @@ class Geo(Euskalmet):
         }
         """
         endpoint = f"/euskalmet/geo/regions/{region_id}/zones/{zone_id}/locations/{location_id}"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
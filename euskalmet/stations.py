@@ -1,22 +1,29 @@
+from __future__ import annotations
+
 import datetime
-import json
-import os
-from functools import partial
-from multiprocessing import Pool
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Union
 
-import numpy as np
-import pandas as pd
-from tqdm import tqdm
+import orjson
 
 from euskalmet import Euskalmet
 from euskalmet.exceptions import EuskalmetException
 
+# numpy, pandas y tqdm se importan dentro de los métodos que los usan, para no pagar su
+# importación al usar solo Geo o Weather
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
 
 class Stations(Euskalmet):
     def __init__(self):
         super().__init__()
 
+        # Sensores y medidas de cada estación ya consultados
+        self._sensor_cache = {}
+        self._measure_triples = {}
+
     def get_stations(self) -> dict:
         """
         Devuelve la lista de estaciones disponibles.
@@ -72,6 +79,9 @@ class Stations(Euskalmet):
         """
         Devuelve las lecturas para una medida específica y una fecha específica.
 
+        Las lecturas de horas que ya han pasado no cambian, por lo que se guardan en disco y no
+        se vuelven a pedir a la API.
+
         Parameters
         ----------
         station_id: str
@@ -105,7 +115,13 @@ class Stations(Euskalmet):
             f"at/{int(year):04}/{int(month):02}/{int(day):02}/{int(hour):02}"
         )
 
-        data = self._download(url)
+        # Se deja un margen de 2 horas por si la estación envía las lecturas con retraso
+        date = datetime.datetime(
+            int(year), int(month), int(day), int(hour), tzinfo=datetime.timezone.utc
+        )
+        cache = date < datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+
+        data = self._download(url, cache=cache)
 
         return data
 
@@ -128,7 +144,7 @@ class Stations(Euskalmet):
         - https://www.opendata.euskadi.eus/api-euskalmet/?api=stations_sensors#/Sensors/get_euskalmet_sensors__sensor_id_
         """
         endpoint = f"/euskalmet/sensors"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -151,7 +167,7 @@ class Stations(Euskalmet):
         - https://www.opendata.euskadi.eus/api-euskalmet/?api=stations_sensors#/Sensors/get_euskalmet_sensors__sensor_id_
         """
         endpoint = f"/euskalmet/sensors/{sensor_id}"
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=True)
 
         return data
 
@@ -163,7 +179,7 @@ class Stations(Euskalmet):
         """
         Devuelve la lista de sensores de la estación.
 
-        Como es un recurso que se utiliza mucho, se cachea en memoria.
+        Como es un recurso que se utiliza mucho, se cachea en memoria y en disco.
 
         Parameters
         ----------
@@ -175,19 +191,263 @@ class Stations(Euskalmet):
         dict
             Diccionario con los sensores de la estación.
         """
-        station_file_data = self.data_dir / f"{station_id}_info.json"
-        if not station_file_data.is_file():
+        if station_id in self._sensor_cache:
+            return self._sensor_cache[station_id]
+
+        cache_key = f"stations/{station_id}/sensors"
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            sensors_info = orjson.loads(cached)
+        else:
             info = self.get_current_station_data(station_id)
             sensor_ids = [x["sensorKey"].split("/")[-1] for x in info["sensors"]]
             sensors_info = {x: self.get_sensor(x)["meteors"] for x in sensor_ids}
-            with open(station_file_data, "w") as fp:
-                json.dump(sensors_info, fp, indent=4)
+            self._cache_set(cache_key, orjson.dumps(sensors_info))
 
-        with open(station_file_data, "r") as fp:
-            sensors_info = json.load(fp)
+        self._sensor_cache[station_id] = sensors_info
 
         return sensors_info
 
+    def _get_measure_triples(self, station_id: str) -> list:
+        """
+        Devuelve las medidas de todos los sensores de la estación.
+
+        Se calcula una única vez por estación para no recorrer los sensores en cada hora.
+
+        Parameters
+        ----------
+        station_id: str
+            Id de la estación
+
+        Returns
+        -------
+        list
+            Tuplas ``(sensor_id, measure_type_id, measure_id)``.
+        """
+        if station_id not in self._measure_triples:
+            sensors_info = self.get_station_sensors(station_id)
+            self._measure_triples[station_id] = [
+                (sensor_id, measure_type["measureType"], measure_type["measureId"])
+                for sensor_id, values in sensors_info.items()
+                for measure_type in values
+            ]
+
+        return self._measure_triples[station_id]
+
+    def _download_readings(self, args: dict) -> Union[dict, None]:
+        """
+        Descarga las lecturas de una medida para una hora concreta.
+
+        Parameters
+        ----------
+        args: dict
+            Argumentos de :meth:`get_station_readings`.
+
+        Returns
+        -------
+        dict, None
+            Lecturas de la medida o None si no hay lecturas para esa hora.
+
+        Raises
+        ------
+        EuskalmetException
+            Si la API devuelve un error distinto de 404.
+        """
+        try:
+            return self.get_station_readings(**args)
+        except EuskalmetException as e:
+            # Un sensor sin datos en esa hora no invalida el resto de medidas
+            if e.status == 404:
+                return None
+            raise
+
+    def _parse_slots(self, slots: list, date_str: str) -> pd.DatetimeIndex:
+        """
+        Convierte los intervalos de las lecturas de una hora en fechas.
+
+        Parameters
+        ----------
+        slots: list
+            Intervalos (``slots``) devueltos por :meth:`get_station_readings`.
+        date_str: str
+            Día UTC de las lecturas en formato YYYY-MM-DD
+
+        Returns
+        -------
+        pd.DatetimeIndex
+            Fechas de las lecturas en timezone Europe/Madrid.
+        """
+        import pandas as pd
+
+        return pd.to_datetime(
+            [f"{date_str} {x['lowerEndPointDesc']}" for x in slots], utc=True
+        ).tz_convert(self.tz)
+
+    def _parse_values(self, values: list, measure_id: str) -> np.ndarray:
+        """
+        Convierte los valores de las lecturas de una medida en un array.
+
+        Parameters
+        ----------
+        values: list
+            Valores (``values``) devueltos por :meth:`get_station_readings`.
+        measure_id: str
+            Id de la medida
+
+        Returns
+        -------
+        np.ndarray
+            Valores de la medida, con NaN donde la API no tiene dato.
+        """
+        import numpy as np
+        import pandas as pd
+
+        # Los valores nulos de la API se convierten a NaN sin recorrer la lista en Python
+        v = pd.array(values, dtype="Float64").to_numpy(dtype="float64", na_value=np.nan)
+        if measure_id in [
+            "max_speed",
+            "speed_sigma",
+            "mean_speed",
+        ]:
+            # Convertir m/s a km/h
+            v *= 3.6
+
+        return v
+
+    def _collect_readings_raw(
+        self,
+        station_id: str,
+        dates: list,
+        executor: ThreadPoolExecutor = None,
+    ) -> tuple:
+        """
+        Descarga las lecturas de una estación para las horas dadas, agrupadas por hora.
+
+        Si se proporciona un ``executor``, las peticiones de todas las horas, sensores y medidas
+        se lanzan a la vez, ya que el tiempo de descarga lo marca la latencia de la API.
+
+        Parameters
+        ----------
+        station_id: str
+            Id de la estación
+        dates: list
+            Horas de las que descargar las lecturas
+        executor: ThreadPoolExecutor
+            Executor con el que realizar las peticiones de forma concurrente.
+
+        Returns
+        -------
+        tuple
+            Nombre de cada medida indexado por ``(sensor_id, measure_id)`` y, por cada hora
+            descargada, sus fechas junto a los valores de cada medida sobre esas fechas.
+        """
+        import pandas as pd
+
+        # Recoger primero todas las medidas de los sensores que tiene la estación
+        triples = self._get_measure_triples(station_id)
+
+        # Preparar las peticiones de cada sensor y hora
+        keys, jobs = [], []
+        for date in dates:
+            # Convertir a UTC, todo lo que depende de la hora se calcula una única vez
+            date = date.tz_convert("utc")
+            date_str = date.strftime("%Y-%m-%d")
+            year, month, day, hour = date.year, date.month, date.day, date.hour
+            for sensor_id, measure_type_id, measure_id in triples:
+                keys.append((date, date_str, sensor_id, measure_id))
+                jobs.append(
+                    dict(
+                        station_id=station_id,
+                        sensor_id=sensor_id,
+                        measure_type_id=measure_type_id,
+                        measure_id=measure_id,
+                        year=year,
+                        month=month,
+                        day=day,
+                        hour=hour,
+                    )
+                )
+
+        # Descargar las medidas de cada sensor
+        if executor is None:
+            results = map(self._download_readings, jobs)
+        else:
+            results = executor.map(self._download_readings, jobs)
+
+        names, hours = {}, {}
+        for (date, date_str, *key), data in zip(keys, results):
+            if data is None:
+                continue
+
+            key = tuple(key)
+            v = self._parse_values(data["values"], key[1])
+            names[key] = data["measure"]
+
+            # Todas las medidas de una hora comparten los mismos intervalos, así que solo se
+            # parsean los de la primera respuesta y el resto se alinean sobre sus fechas
+            if date not in hours:
+                hours[date] = (data["slots"], self._parse_slots(data["slots"], date_str), {})
+            slots, shared_idx, columns = hours[date]
+            if data["slots"] != slots:
+                idx = self._parse_slots(data["slots"], date_str)
+                union = shared_idx.union(idx)
+                columns = {
+                    k: pd.Series(x, index=shared_idx).reindex(union).to_numpy()
+                    for k, x in columns.items()
+                }
+                v = pd.Series(v, index=idx).reindex(union).to_numpy()
+                # A partir de aquí ninguna respuesta coincide con las fechas de la hora
+                hours[date] = (None, union, columns)
+            columns[key] = v
+
+        return names, [(idx, columns) for _, idx, columns in hours.values()]
+
+    def _get_readings(
+        self,
+        station_id: str,
+        dates: list,
+        executor: ThreadPoolExecutor = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve todas las lecturas de una estación para las horas dadas.
+
+        Parameters
+        ----------
+        station_id: str
+            Id de la estación
+        dates: list
+            Horas de las que descargar las lecturas
+        executor: ThreadPoolExecutor
+            Executor con el que realizar las peticiones de forma concurrente.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame con las lecturas de la estación. Las fechas
+            están en timezone Europe/Madrid.
+        """
+        import numpy as np
+        import pandas as pd
+
+        names, hours = self._collect_readings_raw(station_id, dates, executor)
+
+        if len(hours) > 0:
+            # Un único DataFrame con todas las horas, sin alinear índices entre medidas
+            index = hours[0][0].append([idx for idx, _ in hours[1:]])
+            data = [
+                np.concatenate(
+                    [columns.get(key, np.full(len(idx), np.nan)) for idx, columns in hours]
+                )
+                for key in names
+            ]
+            df = pd.DataFrame(np.column_stack(data), index=index, columns=list(names.values()))
+            df.index.name = "DATE"
+            df["station"] = station_id
+        else:
+            df = pd.DataFrame()
+
+        return df
+
     def get_readings_from(self, station_id: str, start_date: pd.Timestamp) -> pd.DataFrame:
         """
         Devuelve todas las lecturas de una estación desde una fecha dada.
@@ -219,149 +479,203 @@ class Stations(Euskalmet):
         2022-05-19 19:40:00+02:00            0.0       127.5  ...      6.696     C017
         2022-05-19 19:50:00+02:00            0.0       105.5  ...      6.336     C017
         """
-        # Recoger primero todos los sensores que tiene la estación
-        sensors_info = self.get_station_sensors(station_id)
+        return self._get_readings(station_id, [start_date])
 
-        # Convertir a UTC
-        start_date = start_date.tz_convert("utc")
+    def _changes_stored(self, df: pd.DataFrame, obs: pd.DataFrame) -> bool:
+        """
+        Indica si las lecturas descargadas modifican las observaciones ya guardadas.
 
-        # Descargar las medidas de cada sensor
-        readings = []
-        for sensor_id, values in sensors_info.items():
-            for measure_type in values:
-                args = dict(
-                    station_id=station_id,
-                    sensor_id=sensor_id,
-                    measure_type_id=measure_type["measureType"],
-                    measure_id=measure_type["measureId"],
-                    year=start_date.year,
-                    month=start_date.month,
-                    day=start_date.day,
-                    hour=start_date.hour,
-                )
+        Es el caso si aparecen columnas nuevas o si alguna lectura igual o anterior a la última
+        guardada cambia o completa las guardadas. Las lecturas posteriores no cuentan, se pueden
+        añadir al final del fichero.
 
-                # Download new readings
-                try:
-                    data = self.get_station_readings(**args)
-                except EuskalmetException as e:
-                    continue
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Lecturas descargadas.
+        obs: pd.DataFrame
+            Observaciones guardadas.
 
-                # Process data
-                dt = pd.Timestamp(
-                    datetime.datetime.fromtimestamp(int(data["dateRange"][6:16])),
-                    tz=self.tz,
-                )
-                idx = [
-                    pd.Timestamp(
-                        f"{dt.tz_convert('utc'):%Y-%m-%d} {x['lowerEndPointDesc']}",
-                        tz="utc",
-                    )
-                    for x in data["slots"]
-                ]
-                idx = pd.to_datetime(idx, utc=True).tz_convert(self.tz)
-
-                v = np.array([np.nan if x is None else x for x in data["values"]])
-                if measure_type["measureId"] in [
-                    "max_speed",
-                    "speed_sigma",
-                    "mean_speed",
-                ]:
-                    # Convertir m/s a km/h
-                    v *= 3.6
-                tmp = pd.DataFrame({"DATE": idx, data["measure"]: v})
-                tmp.set_index("DATE", inplace=True)
-
-                readings.append(tmp)
-
-        if len(readings) > 0:
-            df = pd.concat(readings, axis=1)
-            df["station"] = station_id
-        else:
-            df = pd.DataFrame()
+        Returns
+        -------
+        bool
+            True si hay que reescribir el fichero de observaciones.
+        """
+        import numpy as np
 
-        return df
+        if not df.columns.isin(obs.columns).all():
+            return True
+
+        overlap = df[df.index <= obs.index.max()]
+        if overlap.empty:
+            return False
+
+        # Las lecturas nuevas tienen prioridad sobre las guardadas, igual que al combinarlas
+        stored = obs.reindex(overlap.index)
+        merged = overlap.combine_first(stored)[obs.columns]
+
+        # Los decimales pueden variar en la última cifra al pasar por el CSV
+        numeric = obs.select_dtypes("number").columns
+        other = obs.columns.difference(numeric)
+
+        return not (
+            np.allclose(
+                merged[numeric].to_numpy(dtype=np.float64),
+                stored[numeric].to_numpy(dtype=np.float64),
+                equal_nan=True,
+            )
+            and merged[other].equals(stored[other])
+        )
 
     def automatic_download(
         self,
         station_id: str,
         multiprocess: bool = True,
         start_date: Union[str, pd.Timestamp] = None,
+        max_workers: int = 16,
+        executor: ThreadPoolExecutor = None,
     ):
         """
         Descarga las últimas observaciones de la estación dada. Si el fichero con observaciones
         existe, parte de la última hora registrada hasta ahora para descargar nuevos datos. Si no
-        existe, parte desde el 01-11-2021.
+        existe, parte desde los últimos 30 días. Las horas que ya están en el fichero no se
+        vuelven a descargar.
 
         Finalmente, las guarda en un fichero CSV en ~/.eskalmet/data/.
 
         Parameters
         ----------
         multiprocess: bool
-            Si es True, se utiliza multiprocessing para descargar las lecturas.
+            Si es True, las lecturas se descargan de forma concurrente en varios hilos.
         start_date: str, pd.Timestamp
             Fecha de inicio de la búsqueda
+        max_workers: int
+            Número de hilos con los que se descargan las lecturas si ``multiprocess`` es True.
+        executor: ThreadPoolExecutor
+            Hilos ya creados con los que descargar las lecturas. Si se proporciona, se ignoran
+            ``multiprocess`` y ``max_workers`` y no se cierra al terminar.
         """
+        import pandas as pd
+        from tqdm import tqdm
+
         obs_output = self.data_dir / f"{station_id}_OBS_MERGED.csv"
+
+        # Las observaciones se leen una única vez y se mantienen en memoria
+        obs = None
+        if obs_output.is_file():
+            # Las fechas se parsean con el formato con el que se escriben, que es mucho más
+            # rápido que dejar que read_csv lo deduzca fila a fila
+            obs = pd.read_csv(obs_output, index_col="DATE")
+            obs.index = pd.to_datetime(
+                obs.index, utc=True, format="%Y-%m-%d %H:%M:%S%z"
+            ).tz_convert(self.tz)
+
+        now = pd.Timestamp.now(tz=self.tz)
         if start_date is not None:
             start_date = pd.Timestamp(start_date, tz="utc").tz_convert(self.tz)
-        elif obs_output.is_file():
+        elif obs is not None:
             # Empezar desde la última hora guardada en el fichero
-            obs = pd.read_csv(obs_output, index_col=["DATE"], parse_dates=["DATE"]).tz_convert(
-                self.tz
-            )
             start_date = obs.index.max()
         else:
             # Empezar desde los últimos 30 días
-            start_date = pd.Timestamp(datetime.datetime.utcnow(), tz="utc").tz_convert(
-                self.tz
-            ) - pd.Timedelta(days=30)
-        end_date = pd.Timestamp(datetime.datetime.utcnow(), tz="utc").tz_convert(
-            self.tz
-        ) - pd.Timedelta(hours=1)
-
-        start_date = start_date.floor("H")
-        end_date = end_date.floor("H")
-
-        dates = pd.date_range(start_date, end_date, freq="H")
-
-        # Rellenar con horas anteriores para que sea múltiplo de 6
-        i = 1
-        while len(dates) % 6 != 0:
-            dates = pd.date_range(start_date - pd.Timedelta(hours=i), end_date, freq="H")
-            i += 1
-
-        t_ = tqdm(range(0, len(dates) - 5, 6))
-        for i in t_:
-            t_.set_description(
-                f"[{station_id}] Obteniendo lecturas para {dates[i]} - {dates[i + 5]}"
-            )
+            start_date = now - pd.Timedelta(days=30)
+        end_date = now - pd.Timedelta(hours=1)
+
+        start_date = start_date.floor("h")
+        end_date = end_date.floor("h")
+
+        dates = pd.date_range(start_date, end_date, freq="h")
+
+        # Descargar solo las horas que no están ya guardadas. Una hora se da por descargada si
+        # hay alguna lectura suya, se compara en UTC para evitar las horas ambiguas del cambio
+        # de hora
+        if obs is not None:
+            stored = obs.index.tz_convert("utc").floor("h").unique()
+            # Las 2 últimas horas se vuelven a pedir siempre, porque la estación puede enviar las
+            # lecturas con retraso (ver get_station_readings). La hora de la última lectura
+            # guardada también, porque puede estar a medias: basta con su primer intervalo para
+            # que cuente como guardada
+            recent = now.tz_convert("utc") - pd.Timedelta(hours=2)
+            stored = stored[(stored < recent) & (stored != stored.max())]
+            dates = dates.tz_convert("utc").difference(stored).tz_convert(self.tz)
+        if len(dates) == 0:
+            return
+
+        # Lotes de hasta 6 horas, no tienen por qué ser consecutivas
+        batches = [dates[i : i + 6] for i in range(0, len(dates), 6)]
+        t_ = tqdm(batches)
+
+        # Los lotes descargados se acumulan y se combinan con las observaciones una única vez
+        pending = []
+
+        # Los mismos hilos se reutilizan para todos los lotes
+        own_executor = executor is None and multiprocess
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for batch in t_:
+                t_.set_description(
+                    f"[{station_id}] Obteniendo lecturas para {batch[0]} - {batch[-1]}"
+                )
+
+                df = self._get_readings(station_id, batch, executor)
+
+                if not df.empty:
+                    pending.append(df)
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+            # Guardar las observaciones, aunque la descarga se haya interrumpido
+            if len(pending) > 0:
+                df = pd.concat(pending).sort_index()
+                if obs is None:
+                    df.to_csv(obs_output)
+                elif not self._changes_stored(df, obs):
+                    # Las lecturas que se han vuelto a pedir coinciden con las guardadas, basta
+                    # con añadir al final las posteriores
+                    new = df[df.index > obs.index.max()]
+                    if not new.empty:
+                        new.reindex(columns=obs.columns).to_csv(obs_output, mode="a", header=False)
+                else:
+                    # Las lecturas nuevas tienen prioridad sobre las guardadas
+                    columns = obs.columns.append(df.columns.difference(obs.columns))
+                    obs = df.combine_first(obs)[columns]
+
+                    obs.sort_index(inplace=True)
+                    obs.to_csv(obs_output)
+
+    def automatic_download_many(
+        self, station_ids: list, concurrency: int = 4, max_workers: int = 16
+    ):
+        """
+        Ejecuta :meth:`automatic_download` para varias estaciones a la vez.
+
+        Las estaciones se procesan en paralelo y las peticiones de todas ellas comparten un único
+        grupo de hilos, de forma que el número total de peticiones simultáneas a la API no pasa
+        de ``max_workers``.
+
+        Parameters
+        ----------
+        station_ids: list
+            Identificadores de las estaciones.
+        concurrency: int
+            Número de estaciones que se procesan a la vez.
+        max_workers: int
+            Número de hilos compartidos con los que se descargan las lecturas.
+        """
+        # Las estaciones y las peticiones usan grupos de hilos distintos: si compartiesen uno,
+        # las estaciones podrían ocupar todos los hilos esperando a peticiones que nunca empiezan
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with ThreadPoolExecutor(max_workers=concurrency) as stations_executor:
+                futures = [
+                    stations_executor.submit(self.automatic_download, station_id, executor=executor)
+                    for station_id in station_ids
+                ]
 
-            if multiprocess:
-                # Multiprocess
-                func = partial(self.get_readings_from, station_id)
-                with Pool(processes=os.cpu_count() - 1 or 1) as pool:
-                    dfs = pool.map(func, dates[i : i + 6])
-                df = pd.concat(dfs)
-            else:
-                # Single process
-                df = pd.concat([self.get_readings_from(station_id, dt) for dt in dates[i : i + 6]])
-
-            if not df.empty:
-                # Guardar las observaciones
-                if obs_output.is_file():
-                    obs = pd.read_csv(
-                        obs_output, index_col=["DATE"], parse_dates=["DATE"]
-                    ).tz_convert(self.tz)
-
-                    idx = df.index.intersection(obs.index)
-                    obs.update(df.loc[idx])
-
-                    # Añadir nuevas
-                    idx = df.index.difference(obs.index)
-                    df = pd.concat([obs, df.loc[idx]])
-
-                df.sort_index(inplace=True)
-                df.to_csv(obs_output)
+                # Propagar el primer error, si lo hay
+                for future in futures:
+                    future.result()
 
 
 if __name__ == "__main__":
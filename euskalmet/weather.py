@@ -1,20 +1,65 @@
-from datetime import datetime
-from typing import Union
+from __future__ import annotations
 
-import pandas as pd
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Union
 
 from euskalmet import Euskalmet
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _as_datetime(value: Union[str, date, datetime, pd.Timestamp]) -> datetime:
+    """
+    Convierte la fecha recibida a `datetime` sin pasar por pandas.
+
+    Parameters
+    ----------
+    value: str, date, datetime, pd.Timestamp
+        Fecha en cualquiera de los formatos admitidos. Los textos deben estar en formato ISO
+        (`2022-05-01`, `2022-05-01T10:00`).
+
+    Returns
+    -------
+    datetime
+        La misma fecha como `datetime`. Los `datetime` (y `pd.Timestamp`) se devuelven tal cual.
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+
+    return datetime.fromisoformat(value)
+
 
 class Weather(Euskalmet):
     def __init__(self):
         super().__init__()
 
+    def _is_past_day(self, day: datetime) -> bool:
+        """
+        Indica si la fecha dada es anterior a hoy.
+
+        Las predicciones e informes de días pasados ya no cambian, así que pueden guardarse en
+        disco.
+
+        Parameters
+        ----------
+        day: datetime, pd.Timestamp
+            Fecha a comprobar
+
+        Returns
+        -------
+        bool
+            True si la fecha es anterior a hoy.
+        """
+        return day.date() < datetime.now(self.tz).date()
+
     def get_weather_region(
         self,
         region_id: str,
-        at: Union[str, datetime, pd.Timestamp],
-        forecast_date: Union[str, datetime, pd.Timestamp],
+        at: Union[str, date, datetime, pd.Timestamp],
+        forecast_date: Union[str, date, datetime, pd.Timestamp],
     ) -> dict:
         """
         Obtiene la predicción meteorológica de un día para un día concreto.
@@ -23,9 +68,9 @@ class Weather(Euskalmet):
         ----------
         region_id: str
             Identificador de la región: `basque_country`, `europe`, `iberic_peninsula`.
-        at: str, datetime, pd.Timestamp
+        at: str, date, datetime, pd.Timestamp
             Fecha en la que se realiza la predicción.
-        forecast_date: str, datetime, pd.Timestamp
+        forecast_date: str, date, datetime, pd.Timestamp
             Fecha a predecir.
 
         Returns
@@ -37,20 +82,14 @@ class Weather(Euskalmet):
         ----------
         - https://www.opendata.euskadi.eus/api-euskalmet/?api=weather_region#/
         """
-        at = pd.Timestamp(at)
-        forecast_date = pd.Timestamp(forecast_date)
-
-        params = {
-            "regionId": region_id,
-            "YYYY": f"{at.year:04}",
-            "MM": f"{at.month:02}",
-            "DD": f"{at.day:02}",
-            "YYYYMMDD": forecast_date.strftime("%Y%m%d"),
-        }
-        endpoint = "/euskalmet/weather/regions/{regionId}/forecast/at/{YYYY}/{MM}/{DD}/for/{YYYYMMDD}".format(
-            **params
+        at = _as_datetime(at)
+        forecast_date = _as_datetime(forecast_date)
+
+        endpoint = (
+            f"/euskalmet/weather/regions/{region_id}/"
+            f"forecast/at/{at:%Y/%m/%d}/for/{forecast_date:%Y%m%d}"
         )
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=self._is_past_day(at))
 
         return data
 
@@ -59,17 +98,17 @@ class Weather(Euskalmet):
         region_id: str,
         zone_id: str,
         location_id: str,
-        at: Union[str, datetime, pd.Timestamp],
-        forecast_date: Union[str, datetime, pd.Timestamp],
+        at: Union[str, date, datetime, pd.Timestamp],
+        forecast_date: Union[str, date, datetime, pd.Timestamp],
     ) -> dict:
         """
         Obtiene la predicción meteorológica de un día para un día concreto.
 
             Parameters
             ----------
-            at: str, datetime, pd.Timestamp
+            at: str, date, datetime, pd.Timestamp
                 Fecha en la que se realiza la predicción.
-            forecast_date: str, datetime, pd.Timestamp
+            forecast_date: str, date, datetime, pd.Timestamp
                 Fecha a predecir.
             region_id: str
                 Identificador de la región: `basque_country`, `europe`, `iberic_peninsula`.
@@ -131,22 +170,14 @@ class Weather(Euskalmet):
             }
         }
         """
-        at = pd.Timestamp(at)
-        forecast_date = pd.Timestamp(forecast_date)
-
-        params = {
-            "regionId": region_id,
-            "zoneId": zone_id,
-            "locId": location_id,
-            "YYYY": f"{at.year:04}",
-            "MM": f"{at.month:02}",
-            "DD": f"{at.day:02}",
-            "YYYYMMDD": forecast_date.strftime("%Y%m%d"),
-        }
-        endpoint = "/euskalmet/weather/regions/{regionId}/zones/{zoneId}/locations/{locId}/forecast/at/{YYYY}/{MM}/{DD}/for/{YYYYMMDD}".format(
-            **params
+        at = _as_datetime(at)
+        forecast_date = _as_datetime(forecast_date)
+
+        endpoint = (
+            f"/euskalmet/weather/regions/{region_id}/zones/{zone_id}/locations/{location_id}/"
+            f"forecast/at/{at:%Y/%m/%d}/for/{forecast_date:%Y%m%d}"
         )
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=self._is_past_day(at))
 
         return data
 
@@ -155,7 +186,7 @@ class Weather(Euskalmet):
         region_id: str,
         zone_id: str,
         location_id: str,
-        forecast_date: Union[str, datetime, pd.Timestamp],
+        forecast_date: Union[str, date, datetime, pd.Timestamp],
     ) -> dict:
         """
         Obtiene el último informe de medidas de una localización.
@@ -168,7 +199,7 @@ class Weather(Euskalmet):
             Identificador de la zona.
         location_id: str
             Identificador de la localización.
-        forecast_date: str, datetime, pd.Timestamp
+        forecast_date: str, date, datetime, pd.Timestamp
             Fecha del informe.
 
         Returns
@@ -176,20 +207,13 @@ class Weather(Euskalmet):
         dict
             Último informe de medidas.
         """
-        forecast_date = pd.Timestamp(forecast_date)
-
-        params = {
-            "regionId": region_id,
-            "zoneId": zone_id,
-            "locId": location_id,
-            "YYYY": f"{forecast_date.year:04}",
-            "MM": f"{forecast_date.month:02}",
-            "DD": f"{forecast_date.day:02}",
-        }
-        endpoint = "/euskalmet/weather/regions/{regionId}/zones/{zoneId}/locations/{locId}/reports/for/{YYYY}/{MM}/{DD}/last".format(
-            **params
+        forecast_date = _as_datetime(forecast_date)
+
+        endpoint = (
+            f"/euskalmet/weather/regions/{region_id}/zones/{zone_id}/locations/{location_id}/"
+            f"reports/for/{forecast_date:%Y/%m/%d}/last"
         )
-        data = self._download(endpoint)
+        data = self._download(endpoint, cache=self._is_past_day(forecast_date))
 
         return data
 
@@ -197,7 +221,7 @@ class Weather(Euskalmet):
 if __name__ == "__main__":
     import json
 
-    today = pd.Timestamp.today()
+    today = datetime.today()
     weather = Weather()
     # print(weather.get_weather_region("basque_country", today, today))
     # print(json.dumps(weather.get_weather_forecast_region_zone_location("basque_country", "donostialdea", "donostia", today, today), indent=4))